@@ -1,12 +1,22 @@
-from .jwt_utils import create_access_token, verify_token, get_password_hash, verify_password
-from .oauth_config import get_google_oauth_flow, exchange_code_for_token, get_user_info
+from .jwt_utils import (
+    create_access_token,
+    verify_token,
+    get_password_hash,
+    verify_password,
+    get_password_hash_async,
+    verify_password_async,
+)
+from .oauth_config import get_google_oauth_flow, exchange_code_for_token, get_user_info, close_http_client
 
 __all__ = [
     "create_access_token",
     "verify_token",
     "get_password_hash",
     "verify_password",
+    "get_password_hash_async",
+    "verify_password_async",
     "get_google_oauth_flow",
     "exchange_code_for_token",
     "get_user_info",
+    "close_http_client",
 ]
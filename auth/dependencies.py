@@ -1,5 +1,5 @@
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .jwt_utils import verify_token
 
@@ -20,10 +20,16 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     return payload
 
 
-async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))) -> Optional[dict]:
-    if credentials is None:
+async def get_optional_user(request: Request) -> Optional[dict]:
+    # Read the header directly rather than through HTTPBearer, so anonymous
+    # requests skip the security dependency entirely.
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
         return None
 
-    token = credentials.credentials
     payload = verify_token(token)
     return payload
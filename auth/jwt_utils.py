@@ -1,39 +1,172 @@
+import asyncio
+import base64
+import calendar
+import hashlib
+import hmac
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Mapping, Tuple
 import os
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import time
+import bcrypt
+import jwt
+import orjson
+from jwt import InvalidTokenError as JWTError
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-super-secret-jwt-key-change-this-in-production")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# PEM key files, only used with an asymmetric JWT_ALGORITHM (RS*, PS*, ES*, EdDSA).
+# The public key defaults to the one derived from the private key.
+JWT_PRIVATE_KEY_FILE = os.getenv("JWT_PRIVATE_KEY_FILE")
+JWT_PUBLIC_KEY_FILE = os.getenv("JWT_PUBLIC_KEY_FILE")
+_DEFAULT_EXPIRE_DELTA = timedelta(minutes=JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+def _load_keys() -> Tuple[Any, Any]:
+    """
+    Return the (signing, verification) keys for JWT_ALGORITHM, prepared once
+    at import: the HMAC secret as bytes, or parsed key objects for asymmetric
+    algorithms, so PyJWT never re-encodes a secret or re-parses PEM per token
+    """
+    if JWT_ALGORITHM.startswith("HS"):
+        secret = JWT_SECRET_KEY.encode()
+        return secret, secret
 
-def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+    if not JWT_PRIVATE_KEY_FILE:
+        raise ValueError(f"JWT_PRIVATE_KEY_FILE must be set when JWT_ALGORITHM is {JWT_ALGORITHM}")
+    with open(JWT_PRIVATE_KEY_FILE, "rb") as f:
+        private_key = load_pem_private_key(f.read(), password=None)
+    if JWT_PUBLIC_KEY_FILE:
+        with open(JWT_PUBLIC_KEY_FILE, "rb") as f:
+            public_key = load_pem_public_key(f.read())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+        public_key = private_key.public_key()
+    return private_key, public_key
 
-    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
-    return encoded_jwt
 
+_SIGNING_KEY, _VERIFY_KEY = _load_keys()
 
-def verify_token(token: str) -> Optional[Dict[str, Any]]:
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+# With a fixed HS256 secret the JOSE header and the keyed HMAC state never
+# change, so both are prepared once; create_access_token then only has to
+# serialize the claims and finish a copy of the HMAC.
+_HS256_HEADER = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+_HS256_KEY = hmac.new(JWT_SECRET_KEY.encode(), digestmod=hashlib.sha256)
+
+
+class _OrjsonPyJWT(jwt.PyJWT):
+    """PyJWT decoder that parses the claims with orjson instead of stdlib json."""
+
+    def _decode_payload(self, decoded: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            payload = orjson.loads(decoded["payload"])
+        except orjson.JSONDecodeError as e:
+            raise jwt.DecodeError(f"Invalid payload string: {e}") from e
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError("Invalid payload string: must be a json object")
         return payload
+
+
+_jwt_decoder = _OrjsonPyJWT()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+# The keyword-only underscore parameters on the two hot auth functions below are
+# not meant to be passed: they bind the module constants as defaults, turning
+# per-call global lookups into local ones.
+def create_access_token(
+    data: Dict[str, Any],
+    expires_delta: Optional[timedelta] = None,
+    *,
+    _alg: str = JWT_ALGORITHM,
+    _signing_key: Any = _SIGNING_KEY,
+    _default_delta: timedelta = _DEFAULT_EXPIRE_DELTA,
+    _header: bytes = _HS256_HEADER,
+    _key: "hmac.HMAC" = _HS256_KEY,
+) -> str:
+    to_encode = data.copy()
+    now = datetime.utcnow()
+    expire = now + (expires_delta or _default_delta)
+
+    to_encode.update({"exp": expire, "iat": now})
+    if _alg != "HS256":
+        return jwt.encode(to_encode, _signing_key, algorithm=_alg)
+
+    # NumericDate claims, converted the same way PyJWT does
+    to_encode["exp"] = calendar.timegm(expire.utctimetuple())
+    to_encode["iat"] = calendar.timegm(now.utctimetuple())
+
+    signing_input = _header + b"." + _b64url(orjson.dumps(to_encode))
+    mac = _key.copy()
+    mac.update(signing_input)
+    return (signing_input + b"." + _b64url(mac.digest())).decode()
+
+
+@lru_cache(maxsize=4096)
+def _decode_cached(
+    token: str,
+    *,
+    _decoder: _OrjsonPyJWT = _jwt_decoder,
+    _verify_key: Any = _VERIFY_KEY,
+    _algorithms: tuple = (JWT_ALGORITHM,),
+) -> Mapping[str, Any]:
+    """
+    Decode and verify the token signature once per distinct token string.
+
+    Expiry is deliberately not checked here so a cached entry stays valid until
+    the token naturally expires; verify_token checks "exp" on every call.
+    Invalid tokens raise JWTError, which lru_cache does not memoize, so junk
+    tokens cannot evict valid entries.
+    The keys are bound at import, so rotating JWT_SECRET_KEY (or the PEM
+    files) takes a process restart.
+    """
+    payload = _decoder.decode(
+        token,
+        _verify_key,
+        algorithms=_algorithms,
+        options={"verify_exp": False},
+    )
+    return MappingProxyType(payload)
+
+
+def verify_token(token: str, *, _decode=_decode_cached, _now=time.time) -> Optional[Dict[str, Any]]:
+    try:
+        payload = _decode(token)
     except JWTError:
         return None
 
+    exp = payload.get("exp")
+    if exp is not None and exp < _now():
+        return None
+
+    return dict(payload)
+
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+    except ValueError:
+        # Not a bcrypt hash (e.g. the "oauth_google" placeholder)
+        return False
+
+
+# bcrypt is CPU-bound but releases the GIL, so the default thread pool keeps it off the event loop
+async def get_password_hash_async(password: str) -> str:
+    return await asyncio.to_thread(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
@@ -1,20 +1,49 @@
+import logging
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
+from oauthlib.oauth2.rfc6749.errors import InvalidGrantError
 import httpx
 
+log = logging.getLogger(__name__)
+
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:8001/auth/google/callback")
 
+# Logged (truncated) by exchange_code_for_token; snapshot once instead of per call
+_CLIENT_ID_PREFIX = (GOOGLE_CLIENT_ID or "NOT SET")[:20]
+
 GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
 SCOPES = [
     "openid",
     "https://www.googleapis.com/auth/userinfo.email",
     "https://www.googleapis.com/auth/userinfo.profile"
 ]
 
+# OAuth client config, built once at import and shared by every Flow. The
+# redirect URI is passed to Flow directly, so no per-call copy is needed.
+_CLIENT_CONFIG = {
+    "web": {
+        "client_id": GOOGLE_CLIENT_ID,
+        "client_secret": GOOGLE_CLIENT_SECRET,
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": GOOGLE_TOKEN_URI,
+    }
+}
+
+# Shared client for both Google calls made by a callback (token exchange and
+# userinfo), so repeated callbacks reuse pooled keep-alive HTTP/2 connections
+# to googleapis.com instead of paying a fresh TCP + TLS handshake each time.
+# Closed from the application's shutdown hook in main.py.
+_HTTPX = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+    timeout=10.0,
+)
+
 
 def get_google_oauth_flow(redirect_uri: str = None) -> Flow:
     """
@@ -28,25 +57,15 @@ def get_google_oauth_flow(redirect_uri: str = None) -> Flow:
     # Ensure redirect_uri doesn't have trailing slash and is normalized
     redirect = redirect.rstrip('/')
     
-    print(f"[DEBUG] get_google_oauth_flow - Using redirect_uri: {redirect}")
-    print(f"[DEBUG] GOOGLE_CLIENT_ID exists: {bool(GOOGLE_CLIENT_ID)}")
-    print(f"[DEBUG] GOOGLE_CLIENT_SECRET exists: {bool(GOOGLE_CLIENT_SECRET)}")
+    log.debug("get_google_oauth_flow - Using redirect_uri: %s", redirect)
+    log.debug("GOOGLE_CLIENT_ID exists: %s", bool(GOOGLE_CLIENT_ID))
+    log.debug("GOOGLE_CLIENT_SECRET exists: %s", bool(GOOGLE_CLIENT_SECRET))
     
     if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
         raise ValueError("GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET must be set")
     
-    client_config = {
-        "web": {
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "redirect_uris": [redirect],
-        }
-    }
-
     flow = Flow.from_client_config(
-        client_config=client_config,
+        client_config=_CLIENT_CONFIG,
         scopes=SCOPES,
         redirect_uri=redirect
     )
@@ -54,9 +73,27 @@ def get_google_oauth_flow(redirect_uri: str = None) -> Flow:
     return flow
 
 
+def _oauth_error(response: httpx.Response) -> Optional[str]:
+    """
+    The OAuth "error" code of a token endpoint response, or None when the body
+    is not a JSON error object (e.g. an HTML page from a proxy)
+    """
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        return None
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body.get("error") if isinstance(body, dict) else None
+
+
 async def exchange_code_for_token(code: str, redirect_uri: str = None) -> Dict[str, Any]:
     """
     Exchange OAuth code for access token.
+
+    Posts to Google's token endpoint on the shared async client rather than
+    going through Flow.fetch_token, whose blocking requests call would stall
+    the event loop for the whole round trip.
     
     Args:
         code: OAuth authorization code from Google
@@ -65,45 +102,57 @@ async def exchange_code_for_token(code: str, redirect_uri: str = None) -> Dict[s
     Raises:
         InvalidGrantError: If the code has already been used or is invalid
     """
-    import os
-    from oauthlib.oauth2.rfc6749.errors import InvalidGrantError
-    
-    print(f"[DEBUG] exchange_code_for_token called with redirect_uri: {redirect_uri}")
-    print(f"[DEBUG] GOOGLE_CLIENT_ID: {os.getenv('GOOGLE_CLIENT_ID', 'NOT SET')[:20]}...")
-    
-    flow = get_google_oauth_flow(redirect_uri=redirect_uri)
-    print(f"[DEBUG] Created flow, attempting to fetch token...")
+    redirect = (redirect_uri or GOOGLE_REDIRECT_URI).rstrip('/')
+
+    log.debug("exchange_code_for_token called with redirect_uri: %s", redirect)
+    log.debug("GOOGLE_CLIENT_ID: %s...", _CLIENT_ID_PREFIX)
+
+    if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
+        raise ValueError("GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET must be set")
+
     try:
-        flow.fetch_token(code=code)
-    except InvalidGrantError as e:
+        response = await _HTTPX.post(
+            GOOGLE_TOKEN_URI,
+            data={
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": redirect,
+                "client_id": GOOGLE_CLIENT_ID,
+                "client_secret": GOOGLE_CLIENT_SECRET,
+            },
+        )
+    except Exception:
+        log.exception("Token request failed (code: %s..., redirect_uri: %s)", code[:20], redirect)
+        raise
+
+    if response.status_code == 400 and _oauth_error(response) == "invalid_grant":
         # Code has already been used or is invalid
-        print(f"[ERROR] fetch_token failed: {str(e)}")
-        print(f"[ERROR] Code: {code[:20]}...")
-        print(f"[ERROR] Redirect URI: {redirect_uri}")
-        print(f"[WARNING] This code may have already been used. This can happen if the callback is called twice.")
+        log.warning(
+            "Token exchange failed: %s (code: %s..., redirect_uri: %s). This code may have "
+            "already been used. This can happen if the callback is called twice.",
+            response.text, code[:20], redirect,
+        )
         raise InvalidGrantError(
-            error="invalid_grant",
-            error_description="The authorization code has already been used or is invalid. Please try logging in again."
+            description="The authorization code has already been used or is invalid. Please try logging in again."
         )
-    except Exception as e:
-        print(f"[ERROR] fetch_token failed: {str(e)}")
-        print(f"[ERROR] Code: {code[:20]}...")
-        print(f"[ERROR] Redirect URI: {redirect_uri}")
-        raise
-    credentials = flow.credentials
+    response.raise_for_status()
+    token = response.json()
 
     return {
-        "access_token": credentials.token,
-        "refresh_token": credentials.refresh_token,
-        "id_token": credentials.id_token,
+        "access_token": token["access_token"],
+        "refresh_token": token.get("refresh_token"),
+        "id_token": token.get("id_token"),
     }
 
 
 async def get_user_info(access_token: str) -> Dict[str, Any]:
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        response.raise_for_status()
-        return response.json()
+    response = await _HTTPX.get(
+        GOOGLE_USERINFO_URL,
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+async def close_http_client() -> None:
+    await _HTTPX.aclose()
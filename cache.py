@@ -0,0 +1,132 @@
+"""
+Redis look-aside cache for User Service reads
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Union
+
+import redis
+import redis.asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Caching is disabled when REDIS_URL is not set
+REDIS_URL = os.getenv("REDIS_URL")
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+USER_LIST_CACHE_TTL = int(os.getenv("USER_LIST_CACHE_TTL", "30"))
+
+USER_LIST_KEY_PATTERN = "users:list:*"
+
+# Google authorization codes are single use and expire within minutes
+OAUTH_CODE_TTL = 600
+
+redis_client: Optional[redis.asyncio.Redis] = (
+    redis.asyncio.Redis.from_url(REDIS_URL, decode_responses=True, socket_timeout=0.5)
+    if REDIS_URL
+    else None
+)
+
+
+def user_key(user_id: int) -> str:
+    # v2 entries carry the ETag ahead of the JSON body (see main.get_user)
+    return f"user:v2:{user_id}"
+
+
+def user_list_key(params: Dict[str, Any]) -> str:
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f"users:list:{digest}"
+
+
+async def cache_get(key: str) -> Optional[str]:
+    """
+    Return the cached value, or None on a miss. Redis errors count as a miss so
+    an unavailable cache never fails a request.
+    """
+    if redis_client is None:
+        return None
+    try:
+        return await redis_client.get(key)
+    except redis.RedisError as e:
+        log.warning("Redis GET %s failed: %s", key, e)
+        return None
+
+
+async def cache_set(key: str, value: Union[str, bytes], ttl: int) -> None:
+    if redis_client is None:
+        return
+    try:
+        await redis_client.set(key, value, ex=ttl)
+    except redis.RedisError as e:
+        log.warning("Redis SET %s failed: %s", key, e)
+
+
+async def invalidate_user_lists() -> None:
+    """
+    Drop every cached /users listing; called on any user mutation
+    """
+    if redis_client is None:
+        return
+    try:
+        keys = [key async for key in redis_client.scan_iter(match=USER_LIST_KEY_PATTERN, count=500)]
+        if keys:
+            await redis_client.delete(*keys)
+    except redis.RedisError as e:
+        log.warning("Redis list invalidation failed: %s", e)
+
+
+async def invalidate_user(user_id: int) -> None:
+    if redis_client is not None:
+        try:
+            await redis_client.delete(user_key(user_id))
+        except redis.RedisError as e:
+            log.warning("Redis DEL %s failed: %s", user_key(user_id), e)
+    await invalidate_user_lists()
+
+
+def oauth_code_key(code: str) -> str:
+    return f"oauth:code:{code}"
+
+
+def oauth_code_response_key(code: str) -> str:
+    return f"oauth:code:{code}:resp"
+
+
+async def claim_oauth_code(code: str) -> bool:
+    """
+    Atomically mark an OAuth authorization code as being processed (SET NX).
+
+    Returns False if another callback, on any worker or instance, already
+    claimed it. Without Redis (or if it is unreachable) every caller gets the
+    claim, i.e. duplicate callbacks are simply not deduplicated.
+    """
+    if redis_client is None:
+        return True
+    try:
+        return bool(await redis_client.set(oauth_code_key(code), "1", nx=True, ex=OAUTH_CODE_TTL))
+    except redis.RedisError as e:
+        log.warning("Redis SET NX %s failed: %s", oauth_code_key(code), e)
+        return True
+
+
+async def release_oauth_code(code: str) -> None:
+    """
+    Drop a claim whose callback failed, so a retry reports the real error
+    rather than a duplicate
+    """
+    if redis_client is None:
+        return
+    try:
+        await redis_client.delete(oauth_code_key(code), oauth_code_response_key(code))
+    except redis.RedisError as e:
+        log.warning("Redis DEL %s failed: %s", oauth_code_key(code), e)
+
+
+async def close_redis_client() -> None:
+    if redis_client is not None:
+        await redis_client.aclose()
@@ -2,10 +2,15 @@
 Database setup for User Service with SQLAlchemy
 """
 
+import asyncio
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,30 +32,98 @@ else:
     DB_NAME = os.getenv("DB_NAME", "users")  # Default to 'users' if not set
     print("DB_USER: ", DB_USER)
 
-DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URI = f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Create engine
-engine = create_engine(
+# Connections idle for longer than this are pinged before being handed out
+POOL_PING_IDLE_SECONDS = 60
+
+# Connection budget for one instance, shared by all of its uvicorn workers
+# (each worker has its own pool). A third of each worker's share is kept
+# pooled; the rest is burst overflow.
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "60"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+_WORKER_CONNECTIONS = max(DB_MAX_CONNECTIONS // WEB_CONCURRENCY, 3)
+DB_POOL_SIZE = _WORKER_CONNECTIONS // 3
+
+# Create engine (non-blocking aiomysql driver, so queries never stall the event loop)
+engine = create_async_engine(
     DATABASE_URI,
-    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=_WORKER_CONNECTIONS - DB_POOL_SIZE,
     pool_recycle=1800,
+    pool_pre_ping=False,
+    # Pin every session to UTC, so NOW() and the CURRENT_TIMESTAMP column
+    # defaults agree with timestamps the app stamps itself (see create_user)
+    connect_args={"connect_timeout": 5, "init_command": "SET time_zone = '+00:00'"},
     echo=False
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-db_session = scoped_session(SessionLocal)
+
+# Pool events are emitted by the sync engine the AsyncEngine wraps
+@event.listens_for(engine.sync_engine, "checkin")
+def _record_checkin(dbapi_connection, connection_record):
+    connection_record.info["last_used"] = time.monotonic()
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+    """
+    Liveness check for pooled connections that have sat idle.
+
+    Busy connections are trusted; pool_recycle bounds their age.
+    """
+    last_used = connection_record.info.get("last_used")
+    if last_used is None or time.monotonic() - last_used < POOL_PING_IDLE_SECONDS:
+        return
+    try:
+        engine.dialect.do_ping(dbapi_connection)
+    except Exception:
+        # Makes the pool discard this connection and retry with a fresh one
+        raise exc.DisconnectionError()
+
+
+# Create session factory. Attributes must stay loaded after commit: an
+# AsyncSession cannot lazy-load them again on access.
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Scope key for db_session. Every request gets its own key (set by
+# request_session_scope); ContextVars are inherited by the tasks the request
+# spawns, so all of them see the same session. Outside a request, fall back to
+# the current task.
+_session_scope: ContextVar[Optional[object]] = ContextVar("db_session_scope", default=None)
+
+
+def _current_session_scope():
+    scope = _session_scope.get()
+    return scope if scope is not None else asyncio.current_task()
+
+
+db_session = async_scoped_session(SessionLocal, scopefunc=_current_session_scope)
 
 # Create base class for models
 Base = declarative_base()
-Base.query = db_session.query_property()
 
-def get_db():
+
+@contextmanager
+def request_session_scope():
     """
-    FastAPI dependency to get database session
+    Give db_session a fresh scope for the duration of one request
     """
-    db = SessionLocal()
+    token = _session_scope.set(object())
     try:
-        yield db
+        yield
     finally:
-        db.close()
+        _session_scope.reset(token)
+
+
+async def get_db() -> AsyncSession:
+    """
+    FastAPI dependency to get database session
+
+    Returns the request's session from the db_session registry. It is a plain
+    coroutine rather than a generator, so FastAPI has no teardown to schedule;
+    the middleware in main.py removes the session once the response is built.
+    Being async, it runs on the event loop instead of hopping to the
+    threadpool, and sees the request's session scope directly.
+    """
+    return db_session()
@@ -1,40 +1,52 @@
 # main.py
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
+import json
 import os
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, HTTPException, Query, status, Depends, Request
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi import FastAPI, Header, HTTPException, Query, status, Depends, Request
+from fastapi.responses import RedirectResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import TypeAdapter
 
 from models.user import (
+    MAX_USER_IDS,
+    UserBulkRequest,
     UserCreate,
+    UserPage,
     UserRead,
     UserUpdate,
 )
 from models.db import User as DBUser
-from database import get_db, engine, Base
-from sqlalchemy.orm import Session
+from database import get_db, db_session, engine, Base, request_session_scope
+from cache import (
+    OAUTH_CODE_TTL,
+    USER_CACHE_TTL,
+    USER_LIST_CACHE_TTL,
+    cache_get,
+    cache_set,
+    claim_oauth_code,
+    close_redis_client,
+    invalidate_user,
+    invalidate_user_lists,
+    oauth_code_response_key,
+    release_oauth_code,
+    user_key,
+    user_list_key,
+)
+from sqlalchemy import func, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from datetime import datetime
-from auth.jwt_utils import create_access_token, get_password_hash
-from auth.oauth_config import get_google_oauth_flow, exchange_code_for_token, get_user_info
+from datetime import datetime, timezone
+from auth.jwt_utils import create_access_token, get_password_hash_async, verify_password_async
+from auth.oauth_config import get_google_oauth_flow, exchange_code_for_token, get_user_info, close_http_client
 from auth.dependencies import get_current_user
 
 load_dotenv()
 
-print(load_dotenv())
-
-# Create tables (with error handling for connection issues)
-try:
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created/verified successfully")
-except Exception as e:
-    print(f"Warning: Could not connect to database during startup: {e}")
-    print("Application will start, but database operations will fail until connection is available")
-
 app = FastAPI(
     title="User Service",
     version="0.1.0",
@@ -53,50 +65,301 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def db_session_scope(request: Request, call_next):
+    # Key the scoped DB session registry to this request (see database.py), and
+    # return the request's session to the pool once the response is ready
+    with request_session_scope():
+        try:
+            return await call_next(request)
+        finally:
+            await db_session.remove()
+
+
 # Cloud Run uses PORT, fallback to FASTAPIPORT for local development
 port = int(os.environ.get("PORT", os.environ.get("FASTAPIPORT", 5004)))
 
-# In-memory cache to track processed OAuth codes (prevents duplicate processing)
-# Note: This is cleared on server restart, but helps with duplicate callback calls
-processed_oauth_codes: Dict[str, dict] = {}
+# Named MySQL lock held while creating tables, so that when several workers
+# boot at once only one issues the DDL and the rest find the tables in place
+SCHEMA_LOCK_NAME = "user_service_create_tables"
+SCHEMA_LOCK_TIMEOUT_SECONDS = 30
+
+
+@app.on_event("startup")
+async def create_tables():
+    # Create tables (with error handling for connection issues). Runs at startup
+    # because the async engine needs a running event loop.
+    try:
+        async with engine.begin() as conn:
+            # 1 when acquired; 0 on timeout and NULL on error
+            locked = (
+                await conn.execute(
+                    text("SELECT GET_LOCK(:name, :timeout)"),
+                    {"name": SCHEMA_LOCK_NAME, "timeout": SCHEMA_LOCK_TIMEOUT_SECONDS},
+                )
+            ).scalar_one()
+            if locked != 1:
+                print("Warning: Could not acquire the schema lock; skipping table creation")
+                return
+            try:
+                await conn.run_sync(Base.metadata.create_all)
+            finally:
+                await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": SCHEMA_LOCK_NAME})
+        print("Database tables created/verified successfully")
+    except Exception as e:
+        print(f"Warning: Could not connect to database during startup: {e}")
+        print("Application will start, but database operations will fail until connection is available")
+
+
+@app.on_event("startup")
+async def warmup():
+    # Pay one-time costs before the first request instead of during it. The
+    # models are normally complete at import, so model_rebuild() is a cheap
+    # check; building the OpenAPI schema is the expensive part. The pool
+    # already holds a connection: create_tables used one and returned it.
+    for model in (UserCreate, UserUpdate, UserRead, UserPage, UserBulkRequest):
+        model.model_rebuild()
+    app.openapi()
+
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    await close_http_client()
+    await close_redis_client()
+    await engine.dispose()
 
 
 # ----------------------- USERS -----------------------
-@app.get("/users", response_model=List[UserRead], summary="List all users")
-def list_users(
+# Columns fetched for read responses: everything UserRead needs and nothing
+# else (notably not password_hash), selected as plain rows rather than ORM
+# entities so no identity-map bookkeeping happens per row
+_USER_READ_COLUMNS = (
+    DBUser.user_id,
+    DBUser.first_name,
+    DBUser.last_name,
+    DBUser.email,
+    DBUser.is_deleted,
+    DBUser.deleted_at,
+    DBUser.created_at,
+    DBUser.updated_at,
+)
+_USER_READ_FIELDS = tuple(column.key for column in _USER_READ_COLUMNS)
+# Serializes POST /users/bulk results straight to JSON bytes in pydantic-core
+_USER_BULK_ADAPTER = TypeAdapter(Dict[int, UserRead])
+
+USER_PAGE_DEFAULT_LIMIT = 50
+USER_PAGE_MAX_LIMIT = 500
+
+
+def _json_response(
+    content: Union[str, bytes],
+    status_code: int = status.HTTP_200_OK,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Wrap already-serialized JSON. Routes return this instead of a model so
+    FastAPI skips its response_model validation and encoding pass; the
+    response_model declarations stay for the OpenAPI docs.
+    """
+    return Response(content=content, status_code=status_code, headers=headers, media_type="application/json")
+
+
+# Browsers may reuse a user for this long without asking; after that they
+# revalidate with If-None-Match
+USER_CACHE_CONTROL = "private, max-age=30"
+
+
+def _user_etag(user_id: int, updated_at: datetime) -> str:
+    return f'W/"{user_id}-{updated_at.timestamp()}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+
+def _user_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": USER_CACHE_CONTROL}
+
+
+def _parse_ids(ids: str) -> List[int]:
+    """
+    Parse a comma-separated list of user IDs, sorted and deduplicated so
+    equivalent queries share a cache entry. Capped like POST /users/bulk so
+    neither the IN list nor the cache key grows without bound.
+    """
+    try:
+        id_list = sorted({int(part) for part in ids.split(",") if part.strip()})
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids must be a comma-separated list of integers",
+        )
+    if len(id_list) > MAX_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"ids may list at most {MAX_USER_IDS} users",
+        )
+    return id_list
+
+
+# MySQL error code for a unique key violation
+ER_DUP_ENTRY = 1062
+
+
+def _is_duplicate_key(error: IntegrityError) -> bool:
+    return bool(error.orig.args) and error.orig.args[0] == ER_DUP_ENTRY
+
+
+def _like_prefix(value: str) -> str:
+    """
+    LIKE pattern matching values that start with `value`; wildcards in the
+    input are escaped so they match literally
+    """
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+async def get_active_user_by_email(db: AsyncSession, email: str) -> Optional[DBUser]:
+    """
+    Look up a non-deleted user by email.
+
+    Served by the unique index on users.email, so this is a single index seek
+    rather than a scan; email comparison follows the column's (case-insensitive)
+    MySQL collation.
+    """
+    result = await db.execute(select(DBUser).where(DBUser.email == email, DBUser.is_deleted == False))
+    return result.scalars().first()
+
+
+@app.get("/users", response_model=UserPage, summary="List users, one page at a time")
+async def list_users(
     first_name: Optional[str] = Query(
-        None, description="Case-insensitive substring match on first name"
+        None, description="Case-insensitive prefix match on first name"
     ),
     last_name: Optional[str] = Query(
-        None, description="Case-insensitive substring match on last name"
+        None, description="Case-insensitive prefix match on last name"
     ),
     email: Optional[str] = Query(
-        None, description="Case-insensitive substring match on email"
+        None, description="Case-insensitive prefix match on email"
     ),
     is_deleted: Optional[bool] = Query(None, description="Filter by deletion status"),
-    db: Session = Depends(get_db),
-) -> List[UserRead]:
-    q = db.query(DBUser)
-
+    ids: Optional[str] = Query(
+        None, description=f"Comma-separated user IDs, e.g. 1,2,3 (at most {MAX_USER_IDS})"
+    ),
+    limit: int = Query(
+        USER_PAGE_DEFAULT_LIMIT, ge=1, le=USER_PAGE_MAX_LIMIT, description="Maximum number of users to return"
+    ),
+    offset: int = Query(0, ge=0, description="Number of matching users to skip"),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    id_list = _parse_ids(ids) if ids is not None else None
+    cache_key = user_list_key(
+        {
+            "ids": id_list,
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": email,
+            "is_deleted": is_deleted,
+            "limit": limit,
+            "offset": offset,
+        }
+    )
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return _json_response(cached)
+
+    # Predicates are applied in a single where() call. Plain LIKE is already
+    # case-insensitive under the columns' collation, and prefix matches can use
+    # the email index or ix_users_first_last_name.
+    criteria = []
     if first_name is not None:
-        q = q.filter(DBUser.first_name.ilike(f"%{first_name}%"))
+        criteria.append(DBUser.first_name.like(_like_prefix(first_name), escape="\\"))
     if last_name is not None:
-        q = q.filter(DBUser.last_name.ilike(f"%{last_name}%"))
+        criteria.append(DBUser.last_name.like(_like_prefix(last_name), escape="\\"))
     if email is not None:
-        q = q.filter(DBUser.email.ilike(f"%{email}%"))
+        criteria.append(DBUser.email.like(_like_prefix(email), escape="\\"))
     if is_deleted is not None:
-        q = q.filter(DBUser.is_deleted == is_deleted)
+        criteria.append(DBUser.is_deleted == is_deleted)
+    if id_list is not None:
+        criteria.append(DBUser.user_id.in_(id_list))
+
+    # The window count rides along on every row, so one statement returns both
+    # the page and the total
+    stmt = (
+        select(*_USER_READ_COLUMNS, func.count().over().label("total"))
+        .where(*criteria)
+        .order_by(DBUser.user_id)
+        .limit(limit)
+        .offset(offset)
+    )
+    rows = (await db.execute(stmt)).all()
+    if rows:
+        total = rows[0].total
+    else:
+        # No row to carry the window count (e.g. offset past the end)
+        total = (await db.execute(select(func.count()).select_from(DBUser).where(*criteria))).scalar_one()
+
+    items = [UserRead.model_construct(**dict(zip(_USER_READ_FIELDS, row))) for row in rows]
+    next_offset = offset + len(items)
+    page = UserPage.model_construct(
+        items=items, total=total, next_offset=next_offset if next_offset < total else None
+    )
+    content = page.model_dump_json()
+    await cache_set(cache_key, content, USER_LIST_CACHE_TTL)
+    return _json_response(content)
+
 
-    users = q.all()
-    return [UserRead(**u.to_dict()) for u in users]
+@app.post(
+    "/users/bulk",
+    response_model=Dict[int, UserRead],
+    summary="Fetch several users by ID in one request",
+)
+async def get_users_bulk(body: UserBulkRequest, db: AsyncSession = Depends(get_db)) -> Response:
+    """
+    Return the non-deleted users among `ids`, keyed by user_id. Unknown and
+    deleted IDs are simply absent from the result.
+    """
+    stmt = select(*_USER_READ_COLUMNS).where(DBUser.user_id.in_(set(body.ids)), DBUser.is_deleted == False)
+    rows = (await db.execute(stmt)).all()
+    users = {row.user_id: UserRead.model_construct(**row._mapping) for row in rows}
+    return _json_response(_USER_BULK_ADAPTER.dump_json(users))
 
 
 @app.get("/users/{user_id}", response_model=UserRead, summary="Get detailed user info")
-def get_user(user_id: int, db: Session = Depends(get_db)) -> UserRead:
-    user = db.query(DBUser).filter(DBUser.user_id == user_id).first()
-    if not user:
+async def get_user(
+    user_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    # Look-aside cache: a hit is returned as-is, without touching MySQL. The
+    # entry is "<etag>\n<json>" so the ETag is read without parsing the body.
+    cached = await cache_get(user_key(user_id))
+    if cached is not None:
+        etag, _, cached = cached.partition("\n")
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_user_headers(etag))
+        return _json_response(cached, headers=_user_headers(etag))
+
+    # A conditional request only needs updated_at to be answered with a 304
+    if if_none_match is not None:
+        updated_at = (
+            await db.execute(select(DBUser.updated_at).where(DBUser.user_id == user_id))
+        ).scalar_one_or_none()
+        if updated_at is not None:
+            etag = _user_etag(user_id, updated_at)
+            if _etag_matches(if_none_match, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_user_headers(etag))
+
+    row = (await db.execute(select(*_USER_READ_COLUMNS).where(DBUser.user_id == user_id))).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return UserRead(**user.to_dict())
+    content = UserRead.model_construct(**row._mapping).model_dump_json()
+    etag = _user_etag(user_id, row.updated_at)
+    await cache_set(user_key(user_id), f"{etag}\n{content}", USER_CACHE_TTL)
+    return _json_response(content, headers=_user_headers(etag))
 
 
 @app.post(
@@ -105,23 +368,34 @@ def get_user(user_id: int, db: Session = Depends(get_db)) -> UserRead:
     status_code=status.HTTP_201_CREATED,
     summary="Register a new user",
 )
-def create_user(body: UserCreate, db: Session = Depends(get_db)) -> UserRead:
-    # Check if email already exists
-    existing_user = db.query(DBUser).filter(DBUser.email == body.email, DBUser.is_deleted == False).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already exists")
-
-    new_user = DBUser(
-        first_name=body.first_name,
-        last_name=body.last_name,
-        email=body.email,
-        password_hash=body.password_hash,
-        is_deleted=False,
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return UserRead(**new_user.to_dict())
+async def create_user(body: UserCreate, db: AsyncSession = Depends(get_db)) -> Response:
+    # user_id comes from the driver's lastrowid and the timestamps are stamped
+    # here in UTC (the session time zone), to whole seconds like the columns
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    values = {
+        "first_name": body.first_name,
+        "last_name": body.last_name,
+        "email": body.email,
+        "password_hash": await get_password_hash_async(body.password),
+        "is_deleted": False,
+        "created_at": now,
+        "updated_at": now,
+    }
+    try:
+        result = await db.execute(insert(DBUser).values(**values))
+        await db.commit()
+    except IntegrityError as e:
+        # Email already exists: the unique index on users.email rejects the
+        # insert atomically, so no preflight SELECT is needed
+        await db.rollback()
+        if _is_duplicate_key(e):
+            raise HTTPException(status_code=400, detail="Email already exists")
+        raise
+    await invalidate_user_lists()
+    # model_construct ignores the fields UserRead does not declare
+    # (password_hash)
+    user = UserRead.model_construct(user_id=result.inserted_primary_key[0], deleted_at=None, **values)
+    return _json_response(user.model_dump_json(), status.HTTP_201_CREATED)
 
 
 @app.put(
@@ -129,33 +403,41 @@ def create_user(body: UserCreate, db: Session = Depends(get_db)) -> UserRead:
     response_model=UserRead,
     summary="Update user information (requires JWT)",
 )
-def update_user(user_id: int, body: UserUpdate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)) -> UserRead:
-    user = db.query(DBUser).filter(DBUser.user_id == user_id).first()
-    if not user:
+async def update_user(user_id: int, body: UserUpdate, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)) -> Response:
+    # Update only provided fields, in one UPDATE guarded by is_deleted. MySQL
+    # has no RETURNING, so the row is read back with a SELECT in the same
+    # transaction; that read also tells a missing user from a deleted one.
+    # A changed email that is taken trips the unique index. updated_at is
+    # bumped by the column's ON UPDATE CURRENT_TIMESTAMP.
+    update_data = body.model_dump(exclude_unset=True)
+    password = update_data.pop("password", None)
+    if password is not None:
+        update_data["password_hash"] = await get_password_hash_async(password)
+    if update_data:
+        stmt = (
+            update(DBUser)
+            .where(DBUser.user_id == user_id, DBUser.is_deleted == False)
+            .values(**update_data)
+        )
+        try:
+            await db.execute(stmt)
+        except IntegrityError as e:
+            await db.rollback()
+            if _is_duplicate_key(e):
+                raise HTTPException(status_code=400, detail="Email already exists")
+            raise
+
+    row = (await db.execute(select(*_USER_READ_COLUMNS).where(DBUser.user_id == user_id))).first()
+    if row is None:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="User not found")
-
-    if user.is_deleted:
+    if row.is_deleted:
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Cannot update deleted user")
 
-    # Check if email already exists (if email is being updated)
-    if body.email is not None and body.email != user.email:
-        existing_user = db.query(DBUser).filter(
-            DBUser.email == body.email,
-            DBUser.is_deleted == False,
-            DBUser.user_id != user_id
-        ).first()
-        if existing_user:
-            raise HTTPException(status_code=400, detail="Email already exists")
-
-    # Update only provided fields
-    update_data = body.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(user, key, value)
-
-    user.updated_at = datetime.now() # Update updated_at timestamp
-    db.commit()
-    db.refresh(user)
-    return UserRead(**user.to_dict())
+    await db.commit()
+    await invalidate_user(user_id)
+    return _json_response(UserRead.model_construct(**row._mapping).model_dump_json())
 
 
 @app.delete(
@@ -163,23 +445,58 @@ def update_user(user_id: int, body: UserUpdate, current_user: dict = Depends(get
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Soft delete a user (requires JWT)",
 )
-def delete_user(user_id: int, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if user.is_deleted:
+async def delete_user(user_id: int, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # Soft delete in one statement; deleted_at comes from the database clock
+    # and updated_at from the column's ON UPDATE CURRENT_TIMESTAMP
+    stmt = (
+        update(DBUser)
+        .where(DBUser.user_id == user_id, DBUser.is_deleted == False)
+        .values(is_deleted=True, deleted_at=func.now())
+    )
+    result = await db.execute(stmt)
+    if result.rowcount == 0:
+        user = await db.get(DBUser, user_id)
+        await db.rollback()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         raise HTTPException(status_code=400, detail="User already deleted")
 
-    # Soft delete
-    user.is_deleted = True
-    user.deleted_at = datetime.now()
-    user.updated_at = datetime.now()
-    db.commit()
+    await db.commit()
+    await invalidate_user(user_id)
     return None
 
 
 # ----------------------- AUTH -----------------------
+async def upsert_google_user(db: AsyncSession, email: str, first_name: str, last_name: str) -> Tuple[DBUser, bool]:
+    """
+    Get or create the user for a Google login, returning (user, created).
+
+    A returning user costs one index seek on users.email and no write. Only a
+    miss inserts; if a concurrent first login for the same account wins the
+    race, the unique email index rejects this insert and the winner's row is
+    read instead. An existing user's profile is left as is.
+    """
+    user = (await db.execute(select(DBUser).where(DBUser.email == email))).scalar_one_or_none()
+    if user is not None:
+        return user, False
+
+    user = DBUser(
+        first_name=first_name,
+        last_name=last_name,
+        email=email,
+        password_hash="oauth_google",
+        is_deleted=False,
+    )
+    db.add(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        user = (await db.execute(select(DBUser).where(DBUser.email == email))).scalar_one()
+        return user, False
+    return user, True
+
+
 @app.get("/auth/google/login", summary="Initiate Google OAuth2 login")
 def google_login(redirect_uri: Optional[str] = None):
     """
@@ -206,7 +523,7 @@ def google_login(redirect_uri: Optional[str] = None):
 
 
 @app.get("/auth/google/callback", summary="Google OAuth2 callback")
-async def google_callback(code: str, redirect_uri: Optional[str] = None, db: Session = Depends(get_db)):
+async def google_callback(code: str, redirect_uri: Optional[str] = None, db: AsyncSession = Depends(get_db)):
     """
     Handle Google OAuth2 callback.
     
@@ -216,11 +533,15 @@ async def google_callback(code: str, redirect_uri: Optional[str] = None, db: Ses
     """
     from oauthlib.oauth2.rfc6749.errors import InvalidGrantError
     
-    # Check if we've already processed this code (prevents duplicate processing)
-    if code in processed_oauth_codes:
+    # Claim the code in Redis so a duplicate callback (page refresh, retry, or
+    # the same redirect reaching another worker) is not exchanged twice
+    if not await claim_oauth_code(code):
+        cached = await cache_get(oauth_code_response_key(code))
+        if cached is None:
+            raise HTTPException(status_code=409, detail="This login is already being processed")
         print(f"[INFO] Code already processed, returning cached response")
-        return processed_oauth_codes[code]
-    
+        return _json_response(cached)
+
     try:
         # URL decode the redirect_uri if it's encoded
         if redirect_uri:
@@ -242,21 +563,9 @@ async def google_callback(code: str, redirect_uri: Optional[str] = None, db: Ses
         user_id = None
         
         try:
-            # Check if user exists in DB
-            user = db.query(DBUser).filter(DBUser.email == email, DBUser.is_deleted == False).first()
-
-            if not user:
-                # Create new user
-                user = DBUser(
-                    first_name=first_name,
-                    last_name=last_name,
-                    email=email,
-                    password_hash="oauth_google",
-                    is_deleted=False,
-                )
-                db.add(user)
-                db.commit()
-                db.refresh(user)
+            user, created = await upsert_google_user(db, email, first_name, last_name)
+            if created:
+                await invalidate_user_lists()
             
             user_id = user.user_id
             print(f"[DEBUG] User found/created in DB with ID: {user_id}")
@@ -270,6 +579,9 @@ async def google_callback(code: str, redirect_uri: Optional[str] = None, db: Ses
             user_id = int(hashlib.md5(email.encode()).hexdigest()[:8], 16) % 1000000
             print(f"[WARNING] Temporary user_id: {user_id}")
 
+        if user is not None and user.is_deleted:
+            raise HTTPException(status_code=403, detail="This account has been deleted")
+
         jwt_token = create_access_token(
             data={
                 "sub": str(user_id),
@@ -290,17 +602,14 @@ async def google_callback(code: str, redirect_uri: Optional[str] = None, db: Ses
             }
         }
         
-        # Cache the response for this code (expires after 5 minutes to prevent memory bloat)
-        processed_oauth_codes[code] = response
-        # Clean up old entries periodically (simple approach: limit cache size)
-        if len(processed_oauth_codes) > 1000:
-            # Remove oldest 500 entries (simple FIFO-like cleanup)
-            codes_to_remove = list(processed_oauth_codes.keys())[:500]
-            for old_code in codes_to_remove:
-                del processed_oauth_codes[old_code]
-        
+        # Duplicate callbacks for this code get the same response
+        await cache_set(oauth_code_response_key(code), json.dumps(response), OAUTH_CODE_TTL)
         return response
+    except HTTPException:
+        await release_oauth_code(code)
+        raise
     except InvalidGrantError as e:
+        await release_oauth_code(code)
         # Code has already been used - this can happen if callback is called twice
         # Try to get user from DB if possible (though we won't have email from failed exchange)
         error_msg = "The authorization code has already been used. This may happen if the login page was refreshed. Please try logging in again."
@@ -311,6 +620,7 @@ async def google_callback(code: str, redirect_uri: Optional[str] = None, db: Ses
             detail=error_msg
         )
     except Exception as e:
+        await release_oauth_code(code)
         import traceback
         error_details = str(e)
         print(f"[ERROR] OAuth callback failed: {error_details}")
@@ -319,16 +629,13 @@ async def google_callback(code: str, redirect_uri: Optional[str] = None, db: Ses
 
 
 @app.post("/auth/token", summary="Get JWT token (for testing)")
-def login_for_token(email: str, password: str, db: Session = Depends(get_db)):
+async def login_for_token(email: str, password: str, db: AsyncSession = Depends(get_db)):
     # Find user by email
-    user = db.query(DBUser).filter(DBUser.email == email, DBUser.is_deleted == False).first()
+    user = await get_active_user_by_email(db, email)
     
-    if user:
-        # In a real app, verify password hash here. 
-        # For now, we just check if user exists as per previous logic, 
-        # or we could check if password matches password_hash if it wasn't just a placeholder.
-        # Assuming simple check for now to match previous behavior but using DB.
-        
+    # OAuth users have no usable password: their "oauth_google" placeholder
+    # never verifies
+    if user and await verify_password_async(password, user.password_hash):
         jwt_token = create_access_token(
             data={
                 "sub": str(user.user_id),
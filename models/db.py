@@ -1,11 +1,18 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, text
+from sqlalchemy import Column, Index, Integer, String, Boolean, DateTime, text
 from database import Base
 from datetime import datetime
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Serves GET /users name prefix filters (first_name, or both names)
+        Index("ix_users_first_last_name", "first_name", "last_name"),
+        # Active-user email lookups, and GET /users?is_deleted=...&email=...
+        # as an equality + prefix range on a single index
+        Index("ix_users_active_email", "is_deleted", "email"),
+    )
 
-    user_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, primary_key=True, autoincrement=True)
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=True)
     email = Column(String(255), unique=True, nullable=False, index=True)
@@ -14,16 +21,3 @@ class User(Base):
     deleted_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"))
     updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"))
-
-    def to_dict(self):
-        return {
-            "user_id": self.user_id,
-            "first_name": self.first_name,
-            "last_name": self.last_name,
-            "email": self.email,
-            "password_hash": self.password_hash,
-            "is_deleted": self.is_deleted,
-            "deleted_at": self.deleted_at,
-            "created_at": self.created_at,
-            "updated_at": self.updated_at,
-        }
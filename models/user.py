@@ -4,27 +4,73 @@ from enum import Enum
 from typing import Optional, List
 from uuid import UUID, uuid4
 from datetime import date, datetime
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, field_validator
+
+# bcrypt only uses the first 72 bytes, and current bcrypt rejects longer input
+PASSWORD_MAX_BYTES = 72
+
+
+def _check_password_bytes(password: Optional[str]) -> Optional[str]:
+    if password is not None and len(password.encode()) > PASSWORD_MAX_BYTES:
+        raise ValueError(f"password must be at most {PASSWORD_MAX_BYTES} bytes when UTF-8 encoded")
+    return password
 
 class UserBase(BaseModel):
     first_name: str = Field(..., max_length=100, description="The user's first name")
     last_name: Optional[str] = Field(None, max_length=100, description="The user's last name")
     email: EmailStr = Field(..., max_length=255, description="The user's email address")
-    password_hash: str = Field(..., max_length=255, description="The hashed password of the user")
 
 
 class UserCreate(UserBase):
-    pass
+    # max_length counts characters; the validator enforces bcrypt's byte limit
+    password: str = Field(..., min_length=8, max_length=72, description="The user's password; hashed before storage")
+
+    @field_validator("password")
+    @classmethod
+    def password_fits_bcrypt(cls, password: Optional[str]) -> Optional[str]:
+        return _check_password_bytes(password)
 
 class UserUpdate(BaseModel):
     first_name: Optional[str] = Field(None, max_length=100, description="The user's first name")
     last_name: Optional[str] = Field(None, max_length=100, description="The user's last name")
     email: Optional[EmailStr] = Field(None, max_length=255, description="The user's email address")
-    password_hash: Optional[str] = Field(None, max_length=255, description="The hashed password of the user")
+    password: Optional[str] = Field(None, min_length=8, max_length=72, description="A new password; hashed before storage")
+
+    @field_validator("password")
+    @classmethod
+    def password_fits_bcrypt(cls, password: Optional[str]) -> Optional[str]:
+        return _check_password_bytes(password)
+
+    # Optional only so they can be omitted; the columns are NOT NULL
+    @field_validator("first_name", "email")
+    @classmethod
+    def not_null(cls, value: Optional[str]) -> str:
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
 
 class UserRead(UserBase):
+    # Built from trusted DB rows via model_construct(); never mutated after
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
     user_id: int = Field(..., description="The unique identifier of the user")
     is_deleted: bool = Field(False, description="Indicates if the user is deleted")
     deleted_at: Optional[datetime] = Field(None, description="Timestamp when the user was deleted")
     created_at: datetime = Field(..., description="Timestamp when the user was created")
-    updated_at: datetime = Field(..., description="Timestamp when the user was last updated")
\ No newline at end of file
+    updated_at: datetime = Field(..., description="Timestamp when the user was last updated")
+
+
+class UserPage(BaseModel):
+    """One page of GET /users results."""
+    items: List[UserRead] = Field(..., description="Users on this page")
+    total: int = Field(..., description="Number of users matching the filters, across all pages")
+    next_offset: Optional[int] = Field(None, description="Offset of the next page, or null on the last page")
+
+
+# Most user IDs one request may ask for, in POST /users/bulk or GET /users?ids=
+MAX_USER_IDS = 500
+
+
+class UserBulkRequest(BaseModel):
+    """Body of POST /users/bulk."""
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_USER_IDS, description=f"IDs of the users to fetch (at most {MAX_USER_IDS})")